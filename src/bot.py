@@ -8,34 +8,115 @@ import asyncio
 import os
 import re
 import logging
+import queue
+import signal
+import string
+import time
+import tempfile
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from datetime import datetime
 from pathlib import Path
-import irc.bot
+import aiohttp
 import irc.strings
 from irc.client import NickMask
-import subprocess
-import threading
-import queue
+from irc.client_aio import AioSimpleIRCClient
+import yt_dlp
 
-# Configure logging
+# Configure logging: callers enqueue records and a listener thread does
+# the actual file/stream writes, so logger.info in the encode pipeline
+# never blocks on disk I/O
+_log_queue = queue.Queue(-1)
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('/app/logs/bot.log'),
-        logging.StreamHandler()
-    ]
+    handlers=[QueueHandler(_log_queue)]
+)
+_log_listener = QueueListener(
+    _log_queue,
+    RotatingFileHandler('/app/logs/bot.log',
+                        maxBytes=10_000_000, backupCount=5),
+    logging.StreamHandler()
 )
+_log_listener.start()
 logger = logging.getLogger(__name__)
 
-class VideoBot(irc.bot.SingleServerIRCBot):
+# Per-stage concurrency caps: enough parallel downloads to keep the pipe
+# busy without letting encodes oversubscribe NVENC sessions or the CPU
+DOWNLOAD_CONCURRENCY = int(os.getenv('IRC_DL_CONCURRENCY', 4))
+ENCODE_CONCURRENCY = int(os.getenv('IRC_ENC_CONCURRENCY', 2))
+
+# Enough workers that downloads keep flowing while encodes hold their slots
+NUM_WORKERS = DOWNLOAD_CONCURRENCY + ENCODE_CONCURRENCY
+
+# Parallel HTTP connections for range-splittable (progressive) downloads
+MAX_CONNECTIONS = int(os.getenv('IRC_MAX_CONNECTIONS', 8))
+
+# Upper bound on simultaneous NVENC sessions to ask the GPU for; the
+# startup probe steps down from here until the driver grants them all
+NVENC_PARALLEL = int(os.getenv('IRC_NVENC_PARALLEL', 3))
+
+# Hard deadlines so a hung yt-dlp (captcha, dead host) or wedged ffmpeg
+# cannot pin a worker forever
+DL_TIMEOUT = int(os.getenv('IRC_DL_TIMEOUT', 600))
+ENC_TIMEOUT = int(os.getenv('IRC_ENC_TIMEOUT', 1800))
+
+class _SanitizeTable(dict):
+    """str.translate table that keeps filename-safe chars and maps the
+    rest to '_' - a single C-loop pass instead of a regex sub"""
+    def __missing__(self, codepoint):
+        return '_'
+
+_SANITIZE_TBL = _SanitizeTable(
+    {ord(c): c for c in string.ascii_letters + string.digits + "-_."})
+
+# Seconds to wait before trying to re-establish a dropped connection
+RECONNECT_DELAY = int(os.getenv('IRC_RECONNECT_DELAY', 30))
+
+class VideoBot(AioSimpleIRCClient):
     def __init__(self, channel, nickname, server, port=6667, password=None):
-        irc.bot.SingleServerIRCBot.__init__(self, [(server, port, password)], nickname, nickname)
+        AioSimpleIRCClient.__init__(self)
         self.channel = channel
-        self.processing_queue = queue.Queue()
-        self.worker_thread = threading.Thread(target=self.process_videos, daemon=True)
-        self.worker_thread.start()
-        
+        self.nickname = nickname
+        self.server = server
+        self.port = port
+        self.password = password
+        self.output_dir = "/app/output"
+        # Everything runs on the asyncio loop now: the IRC connection,
+        # the queue, and the subprocess waits all cooperate instead of
+        # fighting over the GIL from separate threads
+        self.processing_queue = asyncio.Queue()
+        self._workers = []
+        # Stage gates: downloads and encodes each run in parallel up to
+        # their own cap, so a slow encode never blocks the next download
+        self._download_sem = asyncio.Semaphore(DOWNLOAD_CONCURRENCY)
+        # Sized on first use: NVENC machines get the probed session
+        # count, CPU-only machines keep ENCODE_CONCURRENCY
+        self._encode_sem = None
+        self._encode_sem_lock = asyncio.Lock()
+        # NVENC capability never changes during process lifetime; probed
+        # once on first encode instead of forking ffmpeg per video
+        self._has_nvenc = None
+        self._nvenc_help = None
+        # Full NVENC argv variants, specialized once on first encode
+        # (they fold in the probed quality flags)
+        self._nvenc_cuda_args = None
+        self._nvenc_sw_args = None
+        # Long-lived YoutubeDL instances reused across URLs - the
+        # in-process equivalent of a persistent batch worker.
+        # Re-instantiating one per video re-pays extractor setup on each
+        # request. YoutubeDL is not thread-safe, so each executor thread
+        # keeps its own instance: reuse without serializing lookups.
+        self._ydl_opts = {
+            # Same selection the streaming download uses, so the resolved
+            # format URL matches what we would actually fetch
+            "format": "best[height<=720]",
+            "quiet": True,
+            # Keep a dead host from pinning the metadata executor thread
+            "socket_timeout": 30,
+        }
+        self._ydl_local = threading.local()
+
         # URL patterns for video sites
         self.url_patterns = [
             r'https?://(?:www\.)?youtube\.com/watch\?v=[\w-]+',
@@ -45,57 +126,89 @@ class VideoBot(irc.bot.SingleServerIRCBot):
             r'https?://(?:www\.)?twitch\.tv/videos/\d+',
             # Add more patterns as needed
         ]
-        
+        # Union all patterns into one compiled regex so every message is
+        # scanned once instead of once per pattern
+        self._url_re = re.compile(
+            "|".join(f"(?:{p})" for p in self.url_patterns))
+
     def on_nicknameinuse(self, c, e):
         c.nick(c.get_nickname() + "_")
 
     def on_welcome(self, c, e):
         logger.info(f"Connected to server, joining {self.channel}")
         c.join(self.channel)
+        # Spawn the worker coroutines once we are on the loop; guard so a
+        # reconnect does not double them up
+        if not self._workers:
+            for _ in range(NUM_WORKERS):
+                self._workers.append(
+                    self.reactor.loop.create_task(self.process_videos()))
+
+    def on_disconnect(self, c, e):
+        """Schedule a reconnect - without this a netsplit or server
+        restart would leave the loop running with a dead connection"""
+        logger.warning(f"Disconnected from server, "
+                       f"reconnecting in {RECONNECT_DELAY}s...")
+        self.reactor.loop.call_later(RECONNECT_DELAY, self._reconnect)
+
+    def _reconnect(self):
+        """call_later callback: kick off an async reconnect attempt"""
+        self.reactor.loop.create_task(self._do_reconnect())
+
+    async def _do_reconnect(self):
+        try:
+            await self.connection.connect(
+                self.server, self.port, self.nickname, password=self.password)
+            logger.info("Reconnected to server")
+        except Exception as e:
+            logger.error(f"Reconnect failed: {e}, "
+                         f"retrying in {RECONNECT_DELAY}s...")
+            self.reactor.loop.call_later(RECONNECT_DELAY, self._reconnect)
 
     def on_pubmsg(self, c, e):
-        """Handle public messages in the channel"""
+        """Handle public messages in the channel
+
+        The irc dispatcher calls handlers synchronously, so this only
+        enqueues - all blocking work happens in the worker coroutines.
+        """
         message = e.arguments[0]
         nick = e.source.nick
-        
+
         # Look for video URLs in the message
-        urls = self.extract_video_urls(message)
-        if urls:
-            for url in urls:
-                logger.info(f"Found video URL from {nick}: {url}")
-                c.privmsg(self.channel, f"📹 Processing video: {url}")
-                self.processing_queue.put((url, nick))
+        for match in self.extract_video_urls(message):
+            url = match.group(0)
+            logger.info(f"Found video URL from {nick}: {url}")
+            c.privmsg(self.channel, f"📹 Processing video: {url}")
+            self.processing_queue.put_nowait((url, nick))
 
     def on_privmsg(self, c, e):
         """Handle private messages"""
         message = e.arguments[0]
         nick = e.source.nick
-        
+
         # Look for video URLs in private messages too
-        urls = self.extract_video_urls(message)
-        if urls:
-            for url in urls:
-                logger.info(f"Found video URL from {nick} (private): {url}")
-                c.privmsg(nick, f"📹 Processing video: {url}")
-                self.processing_queue.put((url, nick))
+        for match in self.extract_video_urls(message):
+            url = match.group(0)
+            logger.info(f"Found video URL from {nick} (private): {url}")
+            c.privmsg(nick, f"📹 Processing video: {url}")
+            self.processing_queue.put_nowait((url, nick))
 
     def extract_video_urls(self, message):
-        """Extract video URLs from a message"""
-        urls = []
-        for pattern in self.url_patterns:
-            matches = re.findall(pattern, message)
-            urls.extend(matches)
-        return urls
-
-    def process_videos(self):
-        """Worker thread to process video downloads and encoding"""
+        """Yield video URL matches from a message
+
+        Generator so the common no-URL message allocates no list at all.
+        """
+        yield from self._url_re.finditer(message)
+
+    async def process_videos(self):
+        """Worker coroutine to process video downloads and encoding"""
         while True:
+            url, requester = await self.processing_queue.get()
             try:
-                url, requester = self.processing_queue.get()
                 logger.info(f"Processing video: {url} requested by {requester}")
-                
-                success, output_file = self.download_and_encode(url)
-                
+
+                success, output_file = await self.download_and_encode(url)
+
                 if success and output_file:
                     # Notify about completion
                     filename = os.path.basename(output_file)
@@ -107,138 +220,413 @@ class VideoBot(irc.bot.SingleServerIRCBot):
                     message = f"❌ Failed to process video: {url} (requested by {requester})"
                     self.connection.privmsg(self.channel, message)
                     logger.error(f"Video processing failed for: {url}")
-                    
+
             except Exception as e:
                 logger.error(f"Error in video processing: {e}")
             finally:
                 self.processing_queue.task_done()
 
-    def check_nvenc_available(self):
-        """Check if NVENC hardware encoding is available"""
+    async def check_nvenc_available(self):
+        """Check if NVENC hardware encoding is available (cached)"""
+        if self._has_nvenc is None:
+            self._has_nvenc = await self._detect_nvenc()
+        return self._has_nvenc
+
+    async def _detect_nvenc(self):
+        """Probe ffmpeg's encoder list for h264_nvenc"""
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                "ffmpeg", "-hide_banner", "-encoders",
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL)
+            stdout, _ = await asyncio.wait_for(proc.communicate(), timeout=5)
+            # Substring check on raw bytes - no need to decode the whole
+            # encoder list just to search it
+            return b"h264_nvenc" in stdout
+        except FileNotFoundError:
+            logger.error("ffmpeg not found on PATH")
+            return False
+        except asyncio.TimeoutError:
+            logger.warning("ffmpeg encoder probe timed out")
+            proc.kill()
+            return False
+
+    async def _probe_nvenc_sessions(self):
+        """Find how many parallel NVENC sessions the GPU will grant
+
+        Launches NVENC_PARALLEL dummy nullsrc encodes at once and steps
+        down until a batch succeeds - drivers cap sessions per chip, so
+        asking is the only reliable way to know.
+        """
+        for n in range(NVENC_PARALLEL, 1, -1):
+            procs = [
+                await asyncio.create_subprocess_exec(
+                    "ffmpeg", "-hide_banner",
+                    "-f", "lavfi", "-i", "nullsrc=s=1280x720",
+                    "-frames:v", "8", "-c:v", "h264_nvenc", "-f", "null", "-",
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.DEVNULL)
+                for _ in range(n)
+            ]
+            try:
+                returncodes = await asyncio.wait_for(
+                    asyncio.gather(*(p.wait() for p in procs)), timeout=30)
+            except asyncio.TimeoutError:
+                for p in procs:
+                    p.kill()
+                continue
+            if all(rc == 0 for rc in returncodes):
+                logger.info(f"NVENC grants {n} parallel sessions")
+                return n
+        logger.info("NVENC session probe settled on 1 parallel session")
+        return 1
+
+    async def _get_encode_sem(self):
+        """Encode-stage semaphore, sized once on first use"""
+        async with self._encode_sem_lock:
+            if self._encode_sem is None:
+                if await self.check_nvenc_available():
+                    limit = await self._probe_nvenc_sessions()
+                else:
+                    limit = ENCODE_CONCURRENCY
+                self._encode_sem = asyncio.Semaphore(limit)
+        return self._encode_sem
+
+    # Video Codec SDK 10 quality knobs; each is gated on the local ffmpeg
+    # build actually exposing the option
+    _NVENC_QUALITY_FLAGS = [
+        ("-multipass", "fullres"),
+        ("-rc-lookahead", "32"),
+        ("-spatial-aq", "1"),
+        ("-temporal-aq", "1"),
+    ]
+
+    # Fixed argv pieces - everything but the input and output paths is
+    # constant per code path, so build it once instead of per call (and
+    # keep the NVENC/x264 lists from drifting apart)
+    _COMMON_OUTPUT_ARGS = (
+        "-profile:v", "baseline", "-level", "3.1",
+        "-c:a", "aac", "-b:a", "160k",
+        "-movflags", "+faststart",
+    )
+    _CUDA_INPUT_ARGS = ("-hwaccel", "cuda", "-hwaccel_output_format", "cuda")
+    _CUDA_SCALE_ARGS = (
+        "-vf", "scale_cuda=trunc(iw/2)*2:trunc(ih/2)*2:format=nv12",
+    )
+    # NVENC consumes NV12 natively, so the CPU-decode feed converts to
+    # that instead of paying an extra pass through yuv420p
+    _NVENC_SW_SCALE_ARGS = (
+        "-vf", "scale=trunc(iw/2)*2:trunc(ih/2)*2,format=nv12",
+    )
+    # libx264 keeps yuv420p - baseline profile requires planar 4:2:0
+    _X264_SCALE_ARGS = (
+        "-vf", "scale=trunc(iw/2)*2:trunc(ih/2)*2,format=yuv420p",
+    )
+    _X264_ARGS = (
+        *_X264_SCALE_ARGS,
+        "-c:v", "libx264", "-preset", "slow", "-crf", "18",
+        *_COMMON_OUTPUT_ARGS,
+    )
+
+    async def _get_nvenc_args(self):
+        """NVENC argv variants, built once with the probed quality flags
+
+        Returns (cuda_pipeline_args, sw_decode_args).
+        """
+        if self._nvenc_cuda_args is None:
+            codec_args = (
+                "-c:v", "h264_nvenc", "-preset", "p6", "-tune", "hq",
+                "-rc", "vbr", "-cq", "19", "-b:v", "0",
+                *await self._nvenc_quality_flags(),
+                *self._COMMON_OUTPUT_ARGS,
+            )
+            self._nvenc_cuda_args = (*self._CUDA_SCALE_ARGS, *codec_args)
+            self._nvenc_sw_args = (*self._NVENC_SW_SCALE_ARGS, *codec_args)
+        return self._nvenc_cuda_args, self._nvenc_sw_args
+
+    async def _nvenc_quality_flags(self):
+        """Return the SDK10 NVENC flags this ffmpeg build supports
+
+        The -h encoder=h264_nvenc output is probed once and cached, like
+        the encoder list itself.
+        """
+        if self._nvenc_help is None:
+            try:
+                proc = await asyncio.create_subprocess_exec(
+                    "ffmpeg", "-hide_banner", "-h", "encoder=h264_nvenc",
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.DEVNULL)
+                stdout, _ = await asyncio.wait_for(proc.communicate(), timeout=5)
+                # Kept as bytes; the flag names are ASCII, so matching
+                # needs no decode of the full help text
+                self._nvenc_help = stdout
+            except (FileNotFoundError, asyncio.TimeoutError):
+                self._nvenc_help = b""
+
+        flags = []
+        for option, value in self._NVENC_QUALITY_FLAGS:
+            if option.lstrip("-").encode() in self._nvenc_help:
+                flags += [option, value]
+        return flags
+
+    def _get_info_sync(self, url):
+        """Blocking yt-dlp metadata lookup; runs in the default executor"""
+        ydl = getattr(self._ydl_local, "ydl", None)
+        if ydl is None:
+            ydl = self._ydl_local.ydl = yt_dlp.YoutubeDL(self._ydl_opts)
+        return ydl.extract_info(url, download=False)
+
+    async def get_video_info(self, url):
+        """Fetch video metadata without downloading the media"""
         try:
-            result = subprocess.run([
-                "ffmpeg", "-hide_banner", "-encoders"
-            ], capture_output=True, text=True)
-            return "h264_nvenc" in result.stdout
-        except:
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(None, self._get_info_sync, url)
+        except yt_dlp.utils.DownloadError as e:
+            logger.error(f"Failed to get video info: {e}")
+            return None
+
+    @staticmethod
+    def _direct_media_url(info):
+        """Resolved media URL if the chosen format is a progressive file
+
+        HLS/DASH formats return None and take the yt-dlp streaming path.
+        """
+        if info.get("protocol") in ("http", "https") and info.get("url"):
+            return info["url"]
+        return None
+
+    async def _ranged_download(self, media_url, http_headers=None):
+        """Fetch a progressive file with parallel HTTP Range requests
+
+        Splits the file into MAX_CONNECTIONS byte ranges fetched
+        concurrently; each chunk lands via os.pwrite at its own offset,
+        so no locking is needed. Returns the temp file Path, or None if
+        the server does not support ranges or the fetch fails.
+        """
+        Path("/app/temp").mkdir(exist_ok=True)
+        fd, name = tempfile.mkstemp(dir="/app/temp", suffix=".video")
+        dest = Path(name)
+        try:
+            async with aiohttp.ClientSession(
+                    headers=http_headers, raise_for_status=True,
+                    timeout=aiohttp.ClientTimeout(total=DL_TIMEOUT)) as session:
+                async with session.head(media_url, allow_redirects=True) as resp:
+                    size = int(resp.headers.get("Content-Length", "0"))
+                    ranged = "bytes" in resp.headers.get("Accept-Ranges", "").lower()
+                if size <= 0 or not ranged:
+                    raise OSError("server does not support byte ranges")
+
+                os.truncate(fd, size)
+                span = -(-size // MAX_CONNECTIONS)
+
+                async def fetch(start):
+                    end = min(start + span, size) - 1
+                    headers = {"Range": f"bytes={start}-{end}"}
+                    async with session.get(media_url, headers=headers) as r:
+                        # A server may advertise Accept-Ranges on HEAD
+                        # but ignore Range on GET (CDN node changes,
+                        # differing signed URLs) and send the whole file
+                        # on every connection - writing those at our
+                        # offsets would silently corrupt the output
+                        expected = f"bytes {start}-{end}/"
+                        if (r.status != 206 or not r.headers.get(
+                                "Content-Range", "").startswith(expected)):
+                            raise OSError(
+                                f"range {start}-{end} not honoured "
+                                f"(status {r.status})")
+                        offset = start
+                        async for chunk in r.content.iter_chunked(1 << 20):
+                            os.pwrite(fd, chunk, offset)
+                            offset += len(chunk)
+
+                tasks = [asyncio.create_task(fetch(start))
+                         for start in range(0, size, span)]
+                try:
+                    await asyncio.gather(*tasks)
+                except BaseException:
+                    # One range failed (or we were cancelled): stop the
+                    # sibling fetches and wait them out before finally
+                    # closes the fd - a straggler waking with a buffered
+                    # chunk would otherwise pwrite into whatever file
+                    # reuses the descriptor number
+                    for task in tasks:
+                        task.cancel()
+                    await asyncio.gather(*tasks, return_exceptions=True)
+                    raise
+            return dest
+        except (aiohttp.ClientError, OSError, asyncio.TimeoutError) as e:
+            logger.warning(f"Ranged download failed ({e}), "
+                           "falling back to yt-dlp streaming")
+            dest.unlink(missing_ok=True)
+            return None
+        finally:
+            os.close(fd)
+
+    async def _stream_encode(self, source, encoder_args, output_path,
+                             input_args=()):
+        """Run one ffmpeg attempt against source
+
+        source is either a pre-fetched local Path, which ffmpeg reads
+        directly, or a URL that yt-dlp streams into ffmpeg's stdin so
+        the media never touches /app/temp. input_args go before -i
+        (e.g. hwaccel flags for the decoder).
+        """
+        start = time.monotonic()
+
+        if isinstance(source, Path):
+            encoder = await asyncio.create_subprocess_exec(
+                "ffmpeg", *input_args, "-i", str(source),
+                *encoder_args,
+                "-y",  # Overwrite output file
+                str(output_path),
+                start_new_session=True)
+            try:
+                await asyncio.wait_for(encoder.wait(), timeout=ENC_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.error(f"ffmpeg timed out after {ENC_TIMEOUT}s, killing it")
+                self._kill_group(encoder)
+                return False
+            logger.info(f"Encode took {time.monotonic() - start:.1f}s")
+            return encoder.returncode == 0
+
+        url = source
+        read_fd, write_fd = os.pipe()
+        try:
+            downloader = await asyncio.create_subprocess_exec(
+                "yt-dlp", "-f", "best[height<=720]",
+                "--no-part", "-q", "-o", "-", url,
+                stdout=write_fd,
+                start_new_session=True)
+            encoder = await asyncio.create_subprocess_exec(
+                "ffmpeg", *input_args, "-i", "pipe:0",
+                *encoder_args,
+                "-y",  # Overwrite output file
+                str(output_path),
+                stdin=read_fd,
+                start_new_session=True)
+        finally:
+            # Drop the parent's copies so EOF/SIGPIPE propagate between
+            # the two children
+            os.close(write_fd)
+            os.close(read_fd)
+
+        try:
+            # The fused pipe covers both phases, so it gets both budgets
+            await asyncio.wait_for(
+                asyncio.gather(downloader.wait(), encoder.wait()),
+                timeout=DL_TIMEOUT + ENC_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.error(f"Streaming encode timed out after "
+                         f"{DL_TIMEOUT + ENC_TIMEOUT}s, killing the pipeline")
+            self._kill_group(downloader)
+            self._kill_group(encoder)
+            return False
+
+        logger.info(f"Streaming encode took {time.monotonic() - start:.1f}s")
+        if downloader.returncode != 0:
+            logger.error("yt-dlp streaming download failed")
             return False
+        return encoder.returncode == 0
 
-    def download_and_encode(self, url):
-        """Download and encode a video"""
+    @staticmethod
+    def _kill_group(proc):
+        """SIGKILL a child's whole process group
+
+        Children are spawned with start_new_session=True, so this takes
+        out anything they forked as well.
+        """
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    async def encode(self, source, output_path):
+        """Encode stage: run the video through ffmpeg to output_path
+
+        source is a local Path or a URL (see _stream_encode).
+        Returns True on success.
+        """
+        # Check if RTX 4060 NVENC is available
+        if await self.check_nvenc_available():
+            logger.info("RTX 4060 detected! Using GPU encoding (NVENC)...")
+
+            # RTX 4060 NVENC encoding - much faster, good quality.
+            # P6 + fullres multipass + lookahead/AQ close most of the
+            # quality gap to x264 slow; -bf/-b_ref_mode stay out because
+            # the x220 needs baseline profile, which forbids B-frames
+            cuda_args, sw_args = await self._get_nvenc_args()
+
+            # Full NVDEC->CUDA->NVENC pipeline: decode, scale and encode
+            # all stay in GPU memory, no host<->device frame copies
+            if await self._stream_encode(source, cuda_args, output_path,
+                                         input_args=self._CUDA_INPUT_ARGS):
+                logger.info("NVENC encoding completed successfully")
+                return True
+            logger.warning("CUDA decode pipeline failed (codec not supported "
+                           "by NVDEC?), retrying with CPU decode...")
+
+            # CPU decode but still NVENC encode, for inputs NVDEC rejects
+            if await self._stream_encode(source, sw_args, output_path):
+                logger.info("NVENC encoding completed successfully")
+                return True
+            logger.warning("NVENC encoding failed, falling back to CPU encoding...")
+        else:
+            logger.info("NVENC not available, using CPU encoding...")
+
+        # Fallback to CPU encoding if NVENC failed or not available
+        logger.info("Using CPU encoding with x264...")
+        if not await self._stream_encode(source, self._X264_ARGS, output_path):
+            logger.error("CPU encoding also failed")
+            return False
+
+        return True
+
+    async def download_and_encode(self, url):
+        """Run a video through the metadata and streaming-encode stages
+
+        Each stage acquires its own semaphore, so lookups for later URLs
+        overlap with encodes already in flight.
+        """
         try:
             # Generate output filename with timestamp
             now = datetime.now()
             timestamp = now.strftime("%m-%d-%y_%H:%M")
-            
-            # Create temp directory for this download
-            temp_dir = Path("/app/temp")
-            temp_dir.mkdir(exist_ok=True)
-            
-            # Download video info first to get title
-            logger.info(f"Getting video info for: {url}")
-            info_cmd = [
-                "yt-dlp", "--get-title", "--get-filename", 
-                "-o", "%(title)s.%(ext)s", url
-            ]
-            
-            result = subprocess.run(info_cmd, capture_output=True, text=True, cwd=temp_dir)
-            if result.returncode != 0:
-                logger.error(f"Failed to get video info: {result.stderr}")
+
+            async with self._download_sem:
+                info = await self.get_video_info(url)
+            if info is None:
                 return False, None
-                
-            lines = result.stdout.strip().split('\n')
-            title = lines[0] if lines else "video"
-            
+            title = info.get("title", "video")
+
             # Sanitize title for filename
-            safe_title = re.sub(r'[^\w\-_\.]', '_', title)[:50]  # Limit length
-            
-            # Download video
-            logger.info(f"Downloading video: {title}")
-            download_cmd = [
-                "yt-dlp", "-f", "best[height<=720]", 
-                "-o", "input_video.%(ext)s", url
-            ]
-            
-            result = subprocess.run(download_cmd, cwd=temp_dir)
-            if result.returncode != 0:
-                logger.error("Failed to download video")
-                return False, None
-            
-            # Find the downloaded file
-            input_files = list(temp_dir.glob("input_video.*"))
-            if not input_files:
-                logger.error("No input file found after download")
-                return False, None
-                
-            input_file = input_files[0]
-            
+            safe_title = title.translate(_SANITIZE_TBL)[:50]  # Limit length
+
             # Generate output filename
             output_filename = f"{safe_title}-{timestamp}-x220.mp4"
-            output_path = Path("/app/output") / output_filename
-            
-            # Try GPU encoding first, then fallback to CPU
-            success = False
-            
-            # Check if RTX 4060 NVENC is available
-            if self.check_nvenc_available():
-                logger.info("RTX 4060 detected! Using GPU encoding (NVENC)...")
-                
-                # RTX 4060 NVENC encoding - much faster, good quality
-                nvenc_cmd = [
-                    "ffmpeg", "-i", str(input_file),
-                    "-vf", "scale=trunc(iw/2)*2:trunc(ih/2)*2,format=yuv420p",
-                    "-c:v", "h264_nvenc", "-preset", "p4", "-tune", "hq", 
-                    "-rc", "vbr", "-cq", "18", "-b:v", "0",
-                    "-profile:v", "baseline", "-level", "3.1",
-                    "-c:a", "aac", "-b:a", "160k",
-                    "-movflags", "+faststart",
-                    "-y",  # Overwrite output file
-                    str(output_path)
-                ]
-                
-                result = subprocess.run(nvenc_cmd)
-                if result.returncode == 0:
-                    logger.info("NVENC encoding completed successfully")
-                    success = True
-                else:
-                    logger.warning("NVENC encoding failed, falling back to CPU encoding...")
-            else:
-                logger.info("NVENC not available, using CPU encoding...")
-            
-            # Fallback to CPU encoding if NVENC failed or not available
-            if not success:
-                logger.info("Using CPU encoding with x264...")
-                cpu_cmd = [
-                    "ffmpeg", "-i", str(input_file),
-                    "-vf", "scale=trunc(iw/2)*2:trunc(ih/2)*2,format=yuv420p",
-                    "-c:v", "libx264", "-preset", "slow", "-crf", "18",
-                    "-profile:v", "baseline", "-level", "3.1",
-                    "-c:a", "aac", "-b:a", "160k",
-                    "-movflags", "+faststart",
-                    "-y",  # Overwrite output file
-                    str(output_path)
-                ]
-                
-                result = subprocess.run(cpu_cmd)
-                if result.returncode != 0:
-                    logger.error("CPU encoding also failed")
-                    return False, None
-                    
-                success = True
-            
-            if not success:
-                logger.error("All encoding methods failed")
-                return False, None
-            
-            # Clean up temp files
+            output_path = Path(self.output_dir) / output_filename
+
+            # Progressive files are fetched with parallel ranged GETs to
+            # saturate the pipe; HLS/DASH stay on the yt-dlp stream path
+            source = url
+            temp_file = None
+            media_url = self._direct_media_url(info)
+            if media_url:
+                async with self._download_sem:
+                    temp_file = await self._ranged_download(
+                        media_url, info.get("http_headers"))
+                if temp_file is not None:
+                    source = temp_file
+
             try:
-                input_file.unlink()
-                logger.info("Cleaned up temporary files")
-            except:
-                pass
-            
+                async with await self._get_encode_sem():
+                    if not await self.encode(source, output_path):
+                        return False, None
+            finally:
+                if temp_file is not None:
+                    temp_file.unlink(missing_ok=True)
+
             return True, str(output_path)
-            
+
         except Exception as e:
             logger.error(f"Exception in download_and_encode: {e}")
             return False, None
@@ -250,19 +638,20 @@ def main():
     channel = os.getenv('IRC_CHANNEL', '#test')
     nickname = os.getenv('IRC_NICKNAME', 'videobot')
     password = os.getenv('IRC_PASSWORD')  # Optional
-    
+
     # Ensure output and logs directories exist
     Path("/app/output").mkdir(exist_ok=True)
     Path("/app/logs").mkdir(exist_ok=True)
-    
+
     logger.info(f"Starting IRC Video Bot")
     logger.info(f"Server: {server}:{port}")
     logger.info(f"Channel: {channel}")
     logger.info(f"Nickname: {nickname}")
-    
+
     bot = VideoBot(channel, nickname, server, port, password)
-    
+
     try:
+        bot.connect(server, port, nickname, password=password)
         bot.start()
     except KeyboardInterrupt:
         logger.info("Bot stopped by user")
@@ -270,4 +659,4 @@ def main():
         logger.error(f"Bot crashed: {e}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()